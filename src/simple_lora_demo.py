@@ -4,106 +4,122 @@ Simple LoRA Fine-tuning Demo
 A minimal implementation to demonstrate LoRA concepts without heavy dependencies.
 """
 
-import json
+import functools
 import os
-import subprocess
+import shutil
 import sys
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit
 
-class SimpleLoRADemo:
+def _ollama_address(value: Optional[str]) -> Tuple[str, str, int]:
     """
-    A simplified demonstration of LoRA concepts using Ollama.
-    This class provides educational examples without requiring GPU training.
+    Resolve an OLLAMA_HOST value into (scheme, host, port).
+    
+    Accepts the same forms as the Ollama CLI: "host", "host:port" or a URL such
+    as "https://host:port"; an unset value means the local default server.
     """
+    value = (value or "").strip()
+    if "://" in value:
+        url = urlsplit(value)
+        default_port = 443 if url.scheme == "https" else 80
+    else:
+        url = urlsplit(f"http://{value}")
+        default_port = 11434
+    return url.scheme, url.hostname or "127.0.0.1", url.port or default_port
+
+OLLAMA_SCHEME, OLLAMA_HOST, OLLAMA_PORT = _ollama_address(os.environ.get("OLLAMA_HOST"))
+OLLAMA_API_TIMEOUT = 5  # seconds, for quick metadata requests such as /api/tags
+OLLAMA_BASE_URL = "{}://{}:{}".format(
+    OLLAMA_SCHEME,
+    f"[{OLLAMA_HOST}]" if ":" in OLLAMA_HOST else OLLAMA_HOST,
+    OLLAMA_PORT
+)
+
+# Simple synthetic dataset for demonstration, shared read-only by all instances
+_DEMO_DATA = tuple(MappingProxyType(example) for example in [
+    {
+        "instruction": "Explain what a neural network is",
+        "input": "",
+        "output": "A neural network is a computational model inspired by biological neural networks. It consists of interconnected nodes (neurons) organized in layers that process information through weighted connections."
+    },
+    {
+        "instruction": "What is machine learning?",
+        "input": "",
+        "output": "Machine learning is a subset of artificial intelligence that enables computers to learn and improve from experience without being explicitly programmed for every task."
+    },
+    {
+        "instruction": "Define deep learning",
+        "input": "",
+        "output": "Deep learning is a subset of machine learning that uses neural networks with multiple hidden layers to model and understand complex patterns in data."
+    },
+    {
+        "instruction": "Explain gradient descent",
+        "input": "",
+        "output": "Gradient descent is an optimization algorithm used to minimize the loss function in machine learning by iteratively adjusting parameters in the direction of steepest descent."
+    },
+    {
+        "instruction": "What is overfitting?",
+        "input": "",
+        "output": "Overfitting occurs when a machine learning model learns the training data too well, including noise and irrelevant patterns, leading to poor performance on new, unseen data."
+    }
+])
+
+# The demo's explanatory texts only depend on constants, so they are built
+# once at import time instead of on every call.
+_LORA_EXPLANATION = """LoRA (Low-Rank Adaptation) Concept Explanation:
+
+1. TRADITIONAL FINE-TUNING:
+   - Updates ALL parameters in the model
+   - Requires storing full model copies
+   - Computationally expensive
+   - High memory requirements
+
+2. LoRA APPROACH:
+   - Freezes original model weights
+   - Adds small trainable matrices (rank r)
+   - Updates only the small matrices
+   - Merges changes during inference
+
+3. MATHEMATICAL FOUNDATION:
+   - Original weight matrix: W (large)
+   - LoRA decomposition: W + ΔW = W + A×B
+   - A: matrix of size (d × r)
+   - B: matrix of size (r × d)
+   - r << d (rank is much smaller than dimension)
+
+4. KEY BENEFITS:
+   - 90%+ reduction in trainable parameters
+   - Faster training and inference
+   - Multiple adapters can share base model
+   - Easy to switch between tasks
+
+5. PARAMETERS TO TUNE:
+   - r (rank): Controls adapter size (typically 4-64)
+   - alpha: Scaling factor for LoRA weights
+   - target_modules: Which layers to adapt
+"""
+
+# Simulated parameters for Llama 3.2 1B model
+_TOTAL_PARAMS = 1_000_000_000  # 1B parameters
+_HIDDEN_SIZE = 2048
+
+def _build_param_efficiency() -> str:
+    """Build the parameter efficiency comparison of LoRA vs full fine-tuning."""
+    total_params = _TOTAL_PARAMS
     
-    def __init__(self, base_model: str = "llama3.2:1b"):
-        self.base_model = base_model
-        self.demo_data = self._create_demo_dataset()
-        
-    def _create_demo_dataset(self) -> List[Dict]:
-        """Create a simple synthetic dataset for demonstration."""
-        return [
-            {
-                "instruction": "Explain what a neural network is",
-                "input": "",
-                "output": "A neural network is a computational model inspired by biological neural networks. It consists of interconnected nodes (neurons) organized in layers that process information through weighted connections."
-            },
-            {
-                "instruction": "What is machine learning?",
-                "input": "",
-                "output": "Machine learning is a subset of artificial intelligence that enables computers to learn and improve from experience without being explicitly programmed for every task."
-            },
-            {
-                "instruction": "Define deep learning",
-                "input": "",
-                "output": "Deep learning is a subset of machine learning that uses neural networks with multiple hidden layers to model and understand complex patterns in data."
-            },
-            {
-                "instruction": "Explain gradient descent",
-                "input": "",
-                "output": "Gradient descent is an optimization algorithm used to minimize the loss function in machine learning by iteratively adjusting parameters in the direction of steepest descent."
-            },
-            {
-                "instruction": "What is overfitting?",
-                "input": "",
-                "output": "Overfitting occurs when a machine learning model learns the training data too well, including noise and irrelevant patterns, leading to poor performance on new, unseen data."
-            }
-        ]
+    # LoRA parameters calculation
+    rank = 16
+    num_layers = 32
+    hidden_size = _HIDDEN_SIZE
     
-    def explain_lora_concept(self):
-        """Provide a conceptual explanation of LoRA."""
-        explanation = """
-        LoRA (Low-Rank Adaptation) Concept Explanation:
-        
-        1. TRADITIONAL FINE-TUNING:
-           - Updates ALL parameters in the model
-           - Requires storing full model copies
-           - Computationally expensive
-           - High memory requirements
-        
-        2. LoRA APPROACH:
-           - Freezes original model weights
-           - Adds small trainable matrices (rank r)
-           - Updates only the small matrices
-           - Merges changes during inference
-        
-        3. MATHEMATICAL FOUNDATION:
-           - Original weight matrix: W (large)
-           - LoRA decomposition: W + ΔW = W + A×B
-           - A: matrix of size (d × r)
-           - B: matrix of size (r × d)
-           - r << d (rank is much smaller than dimension)
-        
-        4. KEY BENEFITS:
-           - 90%+ reduction in trainable parameters
-           - Faster training and inference
-           - Multiple adapters can share base model
-           - Easy to switch between tasks
-        
-        5. PARAMETERS TO TUNE:
-           - r (rank): Controls adapter size (typically 4-64)
-           - alpha: Scaling factor for LoRA weights
-           - target_modules: Which layers to adapt
-        """
-        return explanation
+    # Assuming we adapt query, key, value, and output projections
+    lora_params_per_layer = 4 * (hidden_size * rank + rank * hidden_size)
+    total_lora_params = num_layers * lora_params_per_layer
     
-    def demonstrate_parameter_efficiency(self):
-        """Show the parameter efficiency of LoRA vs full fine-tuning."""
-        # Simulated parameters for Llama 3.2 1B model
-        total_params = 1_000_000_000  # 1B parameters
-        
-        # LoRA parameters calculation
-        rank = 16
-        num_layers = 32
-        hidden_size = 2048
-        
-        # Assuming we adapt query, key, value, and output projections
-        lora_params_per_layer = 4 * (hidden_size * rank + rank * hidden_size)
-        total_lora_params = num_layers * lora_params_per_layer
-        
-        efficiency = (1 - total_lora_params / total_params) * 100
-        
-        comparison = f"""
+    efficiency = (1 - total_lora_params / total_params) * 100
+    
+    comparison = f"""
         Parameter Efficiency Comparison:
         
         Base Model Parameters: {total_params:,}
@@ -116,12 +132,29 @@ class SimpleLoRADemo:
         This means you can fine-tune a 1B parameter model by only training
         {total_lora_params:,} parameters ({total_lora_params/total_params*100:.3f}% of the original)!
         """
-        return comparison
-    
-    def create_modelfile_example(self, adapter_name: str = "lora-demo"):
-        """Create an example Ollama Modelfile for LoRA adapter."""
-        modelfile_content = f"""# Ollama Modelfile for LoRA Demo
-FROM {self.base_model}
+    return comparison
+
+_PARAM_EFFICIENCY_STR = _build_param_efficiency()
+
+_TRAINING_STEPS_STR = "\n".join([
+    "1. Loading base model (llama3.2:1b)...",
+    "2. Initializing LoRA adapters (rank=16, alpha=32)...",
+    "3. Freezing base model parameters...",
+    "4. Setting up training data...",
+    "5. Training LoRA adapters only...",
+    "   - Epoch 1/3: Loss = 2.45",
+    "   - Epoch 2/3: Loss = 1.87", 
+    "   - Epoch 3/3: Loss = 1.23",
+    "6. Saving LoRA adapter weights...",
+    "7. Merging adapters with base model...",
+    "8. Exporting to GGUF format...",
+    "9. Creating Ollama model..."
+])
+
+# Example Ollama Modelfile, split around the base model and pre-encoded
+_MF_PREFIX = b"""# Ollama Modelfile for LoRA Demo
+FROM """
+_MF_SUFFIX = b"""
 
 # Set custom parameters
 PARAMETER temperature 0.7
@@ -140,48 +173,157 @@ TEMPLATE \"\"\"{{ if .System }}<|start_header_id|>system<|end_header_id|>
 
 \"\"\"
 """
-        return modelfile_content
+
+# Set once a probe reaches the server; failed probes are never cached
+_ollama_reachable = False
+
+def _ollama_up() -> bool:
+    """
+    Probe the Ollama server port with a 100 ms TCP connect.
+    
+    A machine without Ollama fails fast instead of waiting on request timeouts.
+    Only a successful probe is remembered, so a server started later in the
+    same session (e.g. from a notebook) is picked up on the next call.
+    """
+    global _ollama_reachable
+    import socket
+    
+    if not _ollama_reachable:
+        try:
+            with socket.create_connection((OLLAMA_HOST, OLLAMA_PORT), timeout=0.1):
+                _ollama_reachable = True
+        except OSError:
+            pass
+    return _ollama_reachable
+
+def ollama_api(endpoint: str) -> dict:
+    """GET an Ollama API endpoint (e.g. "tags", "version") and return its JSON response."""
+    import json
+    import urllib.request
+    
+    with urllib.request.urlopen(f"{OLLAMA_BASE_URL}/api/{endpoint}", timeout=OLLAMA_API_TIMEOUT) as response:
+        return json.load(response)
+
+def _generate_request(model_name: str, prompt: str, stream: bool = False) -> dict:
+    """Build an /api/generate request body; keep_alive keeps the model loaded between tests."""
+    return {
+        "model": model_name,
+        "prompt": prompt,
+        "stream": stream,
+        "keep_alive": "10m"
+    }
+
+@functools.cache
+def _ollama_path() -> Optional[str]:
+    """Resolve the Ollama CLI on $PATH once; None if it is not installed."""
+    return shutil.which("ollama")
+
+class SimpleLoRADemo:
+    """
+    A simplified demonstration of LoRA concepts using Ollama.
+    This class provides educational examples without requiring GPU training.
+    """
+    
+    def __init__(self, base_model: str = "llama3.2:1b"):
+        self.base_model = base_model
+        self.demo_data = _DEMO_DATA
+        
+    def explain_lora_concept(self):
+        """Provide a conceptual explanation of LoRA."""
+        return _LORA_EXPLANATION
+    
+    def demonstrate_parameter_efficiency(self):
+        """Show the parameter efficiency of LoRA vs full fine-tuning."""
+        return _PARAM_EFFICIENCY_STR
+    
+    def demonstrate_parameter_efficiency_grid(
+        self,
+        ranks: Sequence[int] = (4, 8, 16, 32, 64),
+        layer_counts: Sequence[int] = (16, 24, 32, 40)
+    ) -> str:
+        """
+        Compare LoRA adapter sizes across a grid of ranks and adapted layers.
+        
+        The whole (rank x layers) grid is computed in a single NumPy broadcast,
+        so larger design-space sweeps stay interactive in the notebooks.
+        """
+        import numpy as np
+        
+        rank = np.asarray(ranks, dtype=np.int64)[:, None]
+        num_layers = np.asarray(layer_counts, dtype=np.int64)[None, :]
+        
+        # Same query, key, value and output projections as the single-point case
+        lora_params = 4 * (_HIDDEN_SIZE * rank + rank * _HIDDEN_SIZE) * num_layers
+        efficiency = (1 - lora_params / _TOTAL_PARAMS) * 100
+        
+        lines = [
+            "LoRA Adapter Parameters by Rank and Layers (reduction vs. 1B base model):",
+            "",
+            f"{'rank / layers':>13}" + "".join(f"{n:>22}" for n in layer_counts)
+        ]
+        for r, params_row, efficiency_row in zip(ranks, lora_params, efficiency):
+            cells = "".join(
+                f"{f'{params:,} ({eff:.2f}%)':>22}"
+                for params, eff in zip(params_row.tolist(), efficiency_row.tolist())
+            )
+            lines.append(f"{r:>13}{cells}")
+        return "\n".join(lines)
+    
+    def create_modelfile_example(self, adapter_name: str = "lora-demo"):
+        """Create an example Ollama Modelfile for LoRA adapter."""
+        return self.create_modelfile_example_bytes(adapter_name).decode()
+    
+    def create_modelfile_example_bytes(self, adapter_name: str = "lora-demo") -> bytes:
+        """Create the example Ollama Modelfile as UTF-8 bytes, ready to write to disk."""
+        return _MF_PREFIX + self.base_model.encode() + _MF_SUFFIX
     
     def simulate_training_process(self):
         """Simulate the LoRA training process with explanations."""
-        steps = [
-            "1. Loading base model (llama3.2:1b)...",
-            "2. Initializing LoRA adapters (rank=16, alpha=32)...",
-            "3. Freezing base model parameters...",
-            "4. Setting up training data...",
-            "5. Training LoRA adapters only...",
-            "   - Epoch 1/3: Loss = 2.45",
-            "   - Epoch 2/3: Loss = 1.87", 
-            "   - Epoch 3/3: Loss = 1.23",
-            "6. Saving LoRA adapter weights...",
-            "7. Merging adapters with base model...",
-            "8. Exporting to GGUF format...",
-            "9. Creating Ollama model..."
-        ]
-        
-        return "\n".join(steps)
+        return _TRAINING_STEPS_STR
     
     def test_ollama_model(self, model_name: str = "llama3.2:1b") -> Optional[str]:
         """Test the Ollama model with a sample prompt."""
+        # Only needed here, so plain imports of the demo stay fast
+        import subprocess
+        
         try:
-            # Test if Ollama is available
-            result = subprocess.run(
-                ["ollama", "list"], 
-                capture_output=True, 
-                text=True, 
-                timeout=10
-            )
+            import httpx
+        except ImportError:  # Optional: without it models are tested through the Ollama CLI
+            httpx = None
+        
+        test_prompt = "What is machine learning?"
+        if not _ollama_up():
+            return "Ollama is not available or not running."
+        
+        try:
+            tags = ollama_api("tags")
+            names = {model["name"] for model in tags.get("models", [])}
+            if model_name not in names and f"{model_name}:latest" not in names:
+                return f"Model {model_name} not found. Pull it first with: ollama pull {model_name}"
+            
+            if httpx is not None:
+                try:
+                    # A synchronous request also works when an event loop is
+                    # already running (e.g. in Jupyter), unlike asyncio.run()
+                    with httpx.Client(base_url=OLLAMA_BASE_URL, timeout=60) as client:
+                        response = client.post("/api/generate", json=_generate_request(model_name, test_prompt))
+                        response.raise_for_status()
+                    return f"Model Response:\n{response.json()['response']}"
+                except httpx.TimeoutException:
+                    return "Model test timed out."
             
-            if result.returncode != 0:
-                return "Ollama is not available or not running."
+            ollama_path = _ollama_path()
+            if ollama_path is None:
+                return "Ollama command not found. Please install Ollama first."
             
-            # Test the model with a simple prompt
-            test_prompt = "What is machine learning?"
+            # An absolute executable path and close_fds=False let subprocess
+            # start the CLI with posix_spawn instead of fork+exec
             result = subprocess.run(
-                ["ollama", "run", model_name, test_prompt],
+                [ollama_path, "run", model_name, test_prompt],
                 capture_output=True,
                 text=True,
-                timeout=30
+                timeout=30,
+                close_fds=False
             )
             
             if result.returncode == 0:
@@ -191,48 +333,139 @@ TEMPLATE \"\"\"{{ if .System }}<|start_header_id|>system<|end_header_id|>
                 
         except subprocess.TimeoutExpired:
             return "Model test timed out."
-        except FileNotFoundError:
-            return "Ollama command not found. Please install Ollama first."
         except Exception as e:
             return f"Error testing model: {str(e)}"
     
+    async def test_ollama_model_many(self, prompts: List[str], model_name: Optional[str] = None) -> List[str]:
+        """
+        Test the Ollama model with several prompts concurrently.
+        
+        Returns the model's response to each prompt, in order; model_name
+        defaults to the demo's base model. Each prompt is posted to the
+        /api/generate endpoint at the same time over a single pooled HTTP
+        client, so the total wall time is close to that of the slowest prompt
+        rather than the sum of all of them. keep_alive keeps the model loaded
+        between calls instead of reloading it for every test.
+        
+        Parallelism is a server setting rather than a request option, so the
+        server only processes as many requests at once as it was started with;
+        to match len(prompts), start it with e.g.:
+        
+            OLLAMA_NUM_PARALLEL=8 OLLAMA_MAX_LOADED_MODELS=1 ollama serve
+        
+        OLLAMA_NUM_PARALLEL sets the number of requests each loaded model serves
+        at the same time, and OLLAMA_MAX_LOADED_MODELS caps how many models may be
+        kept in memory concurrently.
+        
+        Requires httpx; raises ImportError if it is not installed.
+        """
+        import asyncio
+        
+        try:
+            import httpx
+        except ImportError as e:
+            raise ImportError("test_ollama_model_many requires httpx: pip install httpx") from e
+        
+        model_name = model_name or self.base_model
+        async with httpx.AsyncClient(base_url=OLLAMA_BASE_URL, timeout=60) as client:
+            async def _one(prompt: str) -> str:
+                response = await client.post("/api/generate", json=_generate_request(model_name, prompt))
+                response.raise_for_status()
+                return response.json()['response']
+            
+            return await asyncio.gather(*[_one(p) for p in prompts])
+    
+    def stream_ollama_response(self, prompt: str, model_name: Optional[str] = None) -> Iterator[str]:
+        """
+        Stream the model's response to a prompt as it is generated.
+        
+        Yields the text chunks of the /api/generate NDJSON stream, so output can
+        be shown from the first token instead of after the whole generation.
+        The timeout applies between chunks, and closing the generator early
+        closes the connection, which stops the generation on the server.
+        """
+        import json
+        import urllib.request
+        
+        request = urllib.request.Request(
+            f"{OLLAMA_BASE_URL}/api/generate",
+            data=json.dumps(_generate_request(model_name or self.base_model, prompt, stream=True)).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=30) as response:
+            for line in response:
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"])
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
+    
     def save_demo_dataset(self, filepath: str = "data/demo_dataset.json"):
         """Save the demo dataset to a JSON file."""
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'w') as f:
-            json.dump(self.demo_data, f, indent=2)
+        directory = os.path.dirname(filepath)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        try:
+            import orjson
+        except ImportError:  # Optional: faster JSON serialization, falls back to the stdlib
+            orjson = None
+        
+        records = [dict(example) for example in self.demo_data]
+        if orjson is not None:
+            data = orjson.dumps(records, option=orjson.OPT_INDENT_2)
+        else:
+            import json
+            data = json.dumps(records, indent=2).encode()
+        
+        fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
         return f"Dataset saved to {filepath}"
     
     def run_complete_demo(self):
         """Run the complete LoRA demonstration."""
-        print("=" * 60)
-        print("LoRA (Low-Rank Adaptation) Fine-tuning Demo")
-        print("=" * 60)
-        
-        print("\n1. CONCEPTUAL EXPLANATION:")
-        print(self.explain_lora_concept())
-        
-        print("\n2. PARAMETER EFFICIENCY:")
-        print(self.demonstrate_parameter_efficiency())
-        
-        print("\n3. SIMULATED TRAINING PROCESS:")
-        print(self.simulate_training_process())
-        
-        print("\n4. EXAMPLE MODELFILE:")
-        modelfile = self.create_modelfile_example()
-        print(modelfile)
+        # Collect every section and write the report to stdout in one go
+        parts: List[str] = [
+            "=" * 60,
+            "LoRA (Low-Rank Adaptation) Fine-tuning Demo",
+            "=" * 60,
+            
+            "\n1. CONCEPTUAL EXPLANATION:",
+            self.explain_lora_concept(),
+            
+            "\n2. PARAMETER EFFICIENCY:",
+            self.demonstrate_parameter_efficiency(),
+            
+            "\n3. SIMULATED TRAINING PROCESS:",
+            self.simulate_training_process(),
+            
+            "\n4. EXAMPLE MODELFILE:",
+            self.create_modelfile_example(),
+        ]
         
-        print("\n5. TESTING BASE MODEL:")
+        parts.append("\n5. TESTING BASE MODEL:")
         test_result = self.test_ollama_model()
-        print(test_result)
+        parts.append(test_result)
         
-        print("\n6. SAVING DEMO DATASET:")
+        parts.append("\n6. SAVING DEMO DATASET:")
         save_result = self.save_demo_dataset()
-        print(save_result)
+        parts.append(save_result)
+        
+        parts += [
+            "\n" + "=" * 60,
+            "Demo completed! Check the generated files for more details.",
+            "=" * 60,
+        ]
         
-        print("\n" + "=" * 60)
-        print("Demo completed! Check the generated files for more details.")
-        print("=" * 60)
+        sys.stdout.write("\n".join(parts) + "\n")
+        sys.stdout.flush()
 
 def main():
     """Main function to run the demo."""
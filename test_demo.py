@@ -3,12 +3,68 @@
 Test script to validate LoRA demo functionality
 """
 
+import contextvars
+import importlib.util
+import io
 import os
 import sys
 import subprocess
 import json
+import mmap
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:  # Optional: faster JSON parsing, falls back to the stdlib
+    orjson = None
+
+# Keys every dataset example must have
+REQUIRED_EXAMPLE_KEYS = frozenset(('instruction', 'input', 'output'))
+
+# Output buffer of the test group running in the current thread, if any
+_test_output = contextvars.ContextVar("test_output", default=None)
+
+class _ContextStdout:
+    """Stdout proxy that redirects writes to the current test group's buffer."""
+    
+    def __init__(self, stream):
+        self._stream = stream
+    
+    def write(self, text):
+        buffer = _test_output.get()
+        return (buffer if buffer is not None else self._stream).write(text)
+    
+    def flush(self):
+        self._stream.flush()
+    
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+    
+    def __getattr__(self, name):
+        # Everything else (encoding, isatty, fileno, buffer, ...) comes from the real stream
+        return getattr(self._stream, name)
+
+def _load_json(path):
+    """Parse a JSON file straight from a read-only memory map."""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if orjson is not None:
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+        return json.loads(mm[:])
+
+def _list_dir(path, cache):
+    """Return the entry names in a directory, scanning it at most once per cache."""
+    if path not in cache:
+        try:
+            with os.scandir(path) as entries:
+                cache[path] = {entry.name for entry in entries}
+        except (FileNotFoundError, NotADirectoryError):
+            cache[path] = set()
+    return cache[path]
+
 def test_file_structure():
     """Test that all required files and directories exist."""
     print("🧪 Testing file structure...")
@@ -30,16 +86,15 @@ def test_file_structure():
         "examples"
     ]
     
-    missing_files = []
-    missing_dirs = []
+    # List each parent directory once instead of stat-ing every path
+    listings = {}
     
-    for file in required_files:
-        if not Path(file).exists():
-            missing_files.append(file)
+    def exists(path):
+        parent, _, name = path.rpartition("/")
+        return name in _list_dir(parent or ".", listings)
     
-    for dir in required_dirs:
-        if not Path(dir).exists():
-            missing_dirs.append(dir)
+    missing_files = [file for file in required_files if not exists(file)]
+    missing_dirs = [dir for dir in required_dirs if not exists(dir)]
     
     if missing_files or missing_dirs:
         print(f"❌ Missing files: {missing_files}")
@@ -82,46 +137,40 @@ def test_python_script():
         print(f"❌ Error running Python script: {e}")
         return False
 
+def _load_demo_module():
+    """Import src/simple_lora_demo.py without adding src/ to sys.path."""
+    path = Path(__file__).resolve().parent / "src" / "simple_lora_demo.py"
+    spec = importlib.util.spec_from_file_location("simple_lora_demo", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
 def test_ollama_availability():
     """Test if Ollama is available and working."""
     print("🧪 Testing Ollama availability...")
     
     try:
-        # Check if ollama command exists
-        result = subprocess.run(
-            ["ollama", "--version"],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
+        # Share the demo's Ollama API helper so both use the same address and timeout
+        ollama_api = _load_demo_module().ollama_api
         
-        if result.returncode == 0:
-            print(f"✅ Ollama available: {result.stdout.strip()}")
-            
-            # Check if model is available
-            result = subprocess.run(
-                ["ollama", "list"],
-                capture_output=True,
-                text=True,
-                timeout=10
-            )
-            
-            if "llama3.2:1b" in result.stdout:
-                print("✅ Llama 3.2 1B model available")
-                return True
-            else:
-                print("⚠️  Llama 3.2 1B model not found")
-                return False
-                
+        # A responding API means Ollama is both installed and running
+        version = ollama_api("version")["version"]
+        print(f"✅ Ollama available: {version}")
+        
+        # Check if model is available
+        names = {model["name"] for model in ollama_api("tags").get("models", [])}
+        if "llama3.2:1b" in names:
+            print("✅ Llama 3.2 1B model available")
+            return True
         else:
-            print("❌ Ollama not available")
+            print("⚠️  Llama 3.2 1B model not found")
             return False
             
-    except subprocess.TimeoutExpired:
-        print("❌ Ollama command timed out")
+    except urllib.error.URLError:
+        print("❌ Ollama not installed or not running")
         return False
-    except FileNotFoundError:
-        print("❌ Ollama not installed")
+    except TimeoutError:
+        print("❌ Ollama request timed out")
         return False
     except Exception as e:
         print(f"❌ Error testing Ollama: {e}")
@@ -137,14 +186,13 @@ def test_dataset_validity():
         return False
     
     try:
-        with open(dataset_path, 'r') as f:
-            data = json.load(f)
+        data = _load_json(dataset_path)
         
         if isinstance(data, list) and len(data) > 0:
             print(f"✅ Dataset valid with {len(data)} examples")
             
             # Check structure of first example
-            if all(key in data[0] for key in ['instruction', 'input', 'output']):
+            if REQUIRED_EXAMPLE_KEYS <= data[0].keys():
                 print("✅ Dataset structure correct")
                 return True
             else:
@@ -154,7 +202,7 @@ def test_dataset_validity():
             print("❌ Dataset empty or invalid format")
             return False
             
-    except json.JSONDecodeError:
+    except ValueError:  # Invalid JSON (json/orjson decode errors) or an empty file
         print("❌ Dataset is not valid JSON")
         return False
     except Exception as e:
@@ -171,39 +219,29 @@ def test_notebook_validity():
         return False
     
     try:
-        with open(notebook_path, 'r') as f:
-            notebook = json.load(f)
+        notebook = _load_json(notebook_path)
         
-        if 'cells' in notebook and len(notebook['cells']) > 0:
-            print(f"✅ Notebook valid with {len(notebook['cells'])} cells")
+        cells = notebook.get('cells')
+        if cells:
+            print(f"✅ Notebook valid with {len(cells)} cells")
             return True
         else:
             print("❌ Notebook structure invalid")
             return False
             
-    except json.JSONDecodeError:
+    except ValueError:  # Invalid JSON (json/orjson decode errors) or an empty file
         print("❌ Notebook is not valid JSON")
         return False
     except Exception as e:
         print(f"❌ Error reading notebook: {e}")
         return False
 
-def run_all_tests():
-    """Run all validation tests."""
-    print("🚀 Running LoRA Demo Validation Tests")
-    print("=" * 40)
-    
-    tests = [
-        test_file_structure,
-        test_python_script,
-        test_dataset_validity,
-        test_notebook_validity,
-        test_ollama_availability
-    ]
+def _run_test_group(tests):
+    """Run a group of tests in order, returning (passed count, captured output)."""
+    buffer = io.StringIO()
+    _test_output.set(buffer)
     
     passed = 0
-    total = len(tests)
-    
     for test in tests:
         try:
             if test():
@@ -213,6 +251,38 @@ def run_all_tests():
             print(f"❌ Test failed with exception: {e}")
             print()
     
+    return passed, buffer.getvalue()
+
+def run_all_tests():
+    """Run all validation tests."""
+    print("🚀 Running LoRA Demo Validation Tests")
+    print("=" * 40)
+    
+    # Groups run in parallel, tests within a group run in order: the dataset
+    # check reads the file written by the script test
+    test_groups = [
+        [test_file_structure],
+        [test_python_script, test_dataset_validity],
+        [test_notebook_validity],
+        [test_ollama_availability]
+    ]
+    
+    passed = 0
+    total = sum(len(group) for group in test_groups)
+    
+    # Each group's output is buffered and printed as a block once it completes
+    stdout = sys.stdout
+    sys.stdout = _ContextStdout(stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=len(test_groups)) as executor:
+            futures = [executor.submit(_run_test_group, group) for group in test_groups]
+            for future in as_completed(futures):
+                group_passed, output = future.result()
+                passed += group_passed
+                stdout.write(output)
+    finally:
+        sys.stdout = stdout
+    
     print("=" * 40)
     print(f"📊 Test Results: {passed}/{total} passed")
     